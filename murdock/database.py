@@ -67,3 +67,6 @@ class Database:
 
     async def delete_jobs(self, query: JobQueryModel):
         await self.db.job.delete_many(query.to_mongodb_query())
+
+    async def delete_jobs_by_uids(self, uids: List[str]):
+        await self.db.job.delete_many({"uid": {"$in": uids}})
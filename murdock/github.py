@@ -1,6 +1,8 @@
+import asyncio
 import base64
 import json
-from typing import Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 
 import httpx
 import yaml
@@ -20,6 +22,8 @@ from murdock.config import MurdockSettings
 
 
 MAX_PAGES_COUNT = 10
+STATUS_FLUSH_DELAY = 0.05
+COMMIT_CACHE_TTL = 60
 
 
 async def check_permissions(
@@ -224,7 +228,94 @@ async def set_commit_status(commit: str, status: dict):
             LOGGER.warning(f"{response}: {response.json()}")
 
 
-async def fetch_murdock_config(commit: str) -> MurdockSettings:
+class StatusWriter:
+    """Coalesce commit status updates and send them in batches.
+
+    Only the latest status submitted for a given commit is sent, pending
+    updates are flushed concurrently shortly after the first submission.
+    """
+
+    def __init__(self, delay: float = STATUS_FLUSH_DELAY):
+        self.delay: float = delay
+        self._pending: Dict[str, dict] = {}
+        self._event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: bool = False
+
+    def start(self):
+        self._running = True
+        self._event = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="MurdockStatusWriter")
+
+    async def stop(self):
+        # Let the loop finish an in-progress flush instead of cancelling it,
+        # the statuses it already took from the pending ones would be lost.
+        self._running = False
+        if self._task is not None:
+            self._event.set()  # type: ignore[union-attr]
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def submit(self, commit: str, status: dict):
+        self._pending[commit] = status
+        if self._event is not None:
+            self._event.set()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        results = await asyncio.gather(
+            *[set_commit_status(commit, status) for commit, status in pending.items()],
+            return_exceptions=True,
+        )
+        for commit, result in zip(pending, results):
+            if isinstance(result, Exception):
+                LOGGER.warning(f"Cannot set commit {commit[0:7]} status: {result}")
+
+    async def _run(self):
+        while self._running:
+            await self._event.wait()  # type: ignore[union-attr]
+            if self._running:
+                await asyncio.sleep(self.delay)
+            self._event.clear()  # type: ignore[union-attr]
+            await self.flush()
+
+
+class CommitCache:
+    """Cache the results of commit based GitHub requests for a short time.
+
+    Concurrent requests for the same commit share a single in-flight request,
+    failed requests (returning None or raising) are not cached.
+    """
+
+    def __init__(self, ttl: float = COMMIT_CACHE_TTL):
+        self.ttl: float = ttl
+        self._entries: Dict[Tuple[Callable, str], Tuple[float, asyncio.Task]] = {}
+
+    def _prune(self, now: float):
+        for key in [key for key, (exp, _) in self._entries.items() if exp <= now]:
+            del self._entries[key]
+
+    async def fetch(self, func: Callable[[str], Awaitable[Any]], commit: str) -> Any:
+        key = (func, commit)
+        now = time.monotonic()
+        if (entry := self._entries.get(key)) is None or entry[0] <= now:
+            self._prune(now)
+            entry = (now + self.ttl, asyncio.ensure_future(func(commit)))
+            self._entries[key] = entry
+        task = entry[1]
+        try:
+            result = await asyncio.shield(task)
+        except Exception:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            raise
+        if result is None and self._entries.get(key) is entry:
+            del self._entries[key]
+        return result
+
+
+async def fetch_murdock_config(commit: str) -> Optional[MurdockSettings]:
     async with httpx.AsyncClient() as client:
         response = await client.get(
             f"https://api.github.com/repos/{GITHUB_CONFIG.repo}"
@@ -234,22 +325,27 @@ async def fetch_murdock_config(commit: str) -> MurdockSettings:
                 "Authorization": f"token {GITHUB_CONFIG.api_token}",
             },
         )
-        if response.status_code != 200:
+        if response.status_code == 404:
             LOGGER.debug("No config file found, using default config")
             return MurdockSettings()
 
+        if response.status_code != 200:
+            LOGGER.warning(f"Cannot fetch config file: {response}")
+            return None
+
         try:
             content = yaml.safe_load(
                 base64.b64decode(response.json()["content"]).decode(),
             )
         except yaml.YAMLError as exc:
             LOGGER.warning(f"Cannot parse config file: {exc}")
-            return MurdockSettings()
+            return None
 
         if not content:
             return MurdockSettings()
 
         try:
             return MurdockSettings(**content)
-        except pydantic.error_wrappers.ValidationError:
-            return MurdockSettings()
+        except pydantic.error_wrappers.ValidationError as exc:
+            LOGGER.warning(f"Invalid config file: {exc}")
+            return None
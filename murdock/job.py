@@ -1,4 +1,4 @@
-import json
+import asyncio
 import os
 import secrets
 import shutil
@@ -7,6 +7,8 @@ import uuid
 
 from typing import Callable, List, Optional
 
+import orjson
+
 from murdock.config import GLOBAL_CONFIG, CI_CONFIG, GITHUB_CONFIG
 from murdock.log import LOGGER
 from murdock.models import PullRequestInfo, CommitModel, JobModel
@@ -45,8 +47,9 @@ class MurdockJob:
         self.stop_time: float = 0
         self.canceled: bool = False
         self.status: dict = {"status": ""}
+        self.last_status_msg: Optional[str] = None
         self.fasttracked: bool = (
-            any(label in CI_CONFIG.fasttrack_labels for label in self.pr.labels)
+            not set(self.pr.labels).isdisjoint(CI_CONFIG.fasttrack_labels)
             if self.pr is not None
             else False
         )  # type: ignore[union-attr]
@@ -79,6 +82,11 @@ class MurdockJob:
         except FileNotFoundError:
             LOGGER.debug(f"Directory '{work_dir}' doesn't exist, cannot remove")
 
+    @staticmethod
+    def write_file(path: str, content: str) -> None:
+        with open(path, "w") as out:
+            out.write(content)
+
     @property
     def runtime(self) -> float:
         return self.stop_time - self.start_time
@@ -204,11 +212,11 @@ class MurdockJob:
         self.output += line
         if self.notify is not None:
             await self.notify(
-                json.dumps({"cmd": "output", "uid": self.uid, "line": line})
+                orjson.dumps({"cmd": "output", "uid": self.uid, "line": line}).decode()
             )
 
     async def exec(self, notify: Callable) -> None:
-        MurdockJob.create_dir(self.work_dir)
+        await asyncio.to_thread(MurdockJob.create_dir, self.work_dir)
 
         self.notify = notify
         for index, task_setting in enumerate(self.config.tasks):
@@ -234,8 +242,9 @@ class MurdockJob:
         # Store job output in text file
         output_text_path = os.path.join(self.work_dir, "output.txt")
         try:
-            with open(output_text_path, "w") as out:
-                out.write(self.output)
+            await asyncio.to_thread(
+                MurdockJob.write_file, output_text_path, self.output
+            )
         except Exception as exc:
             LOGGER.warning(f"Error for {self}: cannot write output.txt: {exc}")
 
@@ -262,4 +271,4 @@ class MurdockJob:
             await self.current_task.stop()
         if not GLOBAL_CONFIG.store_stopped_jobs:
             LOGGER.debug(f"Removing job working directory '{self.work_dir}'")
-            MurdockJob.remove_dir(self.work_dir)
+            await asyncio.to_thread(MurdockJob.remove_dir, self.work_dir)
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod, abstractproperty
-from typing import List, Optional, Sequence
+from typing import Dict, Iterable, List, Optional, Sequence, Set
 
 from murdock.job import MurdockJob
 from murdock.models import JobQueryModel
@@ -8,6 +8,8 @@ from murdock.models import JobQueryModel
 class MurdockJobListBase(ABC):
 
     _jobs: List[Optional[MurdockJob]]
+    _jobs_by_prnum: Dict[int, Set[MurdockJob]]
+    _jobs_by_ref: Dict[str, Set[MurdockJob]]
 
     @abstractproperty
     def jobs(self) -> Sequence[Optional[MurdockJob]]:
@@ -27,11 +29,31 @@ class MurdockJobListBase(ABC):
                 return job
         return None
 
+    def _index_job(self, job: MurdockJob) -> None:
+        if job.pr is not None:
+            self._jobs_by_prnum.setdefault(job.pr.number, set()).add(job)
+        if job.ref is not None:
+            self._jobs_by_ref.setdefault(job.ref, set()).add(job)
+
+    def _unindex_job(self, job: MurdockJob) -> None:
+        if job.pr is not None and job.pr.number in self._jobs_by_prnum:
+            self._jobs_by_prnum[job.pr.number].discard(job)
+            if not self._jobs_by_prnum[job.pr.number]:
+                del self._jobs_by_prnum[job.pr.number]
+        if job.ref is not None and job.ref in self._jobs_by_ref:
+            self._jobs_by_ref[job.ref].discard(job)
+            if not self._jobs_by_ref[job.ref]:
+                del self._jobs_by_ref[job.ref]
+
+    @staticmethod
+    def _sort_jobs(jobs: Iterable[MurdockJob]) -> List[MurdockJob]:
+        return sorted(jobs, reverse=True, key=lambda job: job.creation_time)
+
     def search_by_pr_number(self, prnum: int) -> List[MurdockJob]:
-        return self.search_with_query(JobQueryModel(prnum=prnum))
+        return self._sort_jobs(self._jobs_by_prnum.get(prnum, ()))
 
     def search_by_ref(self, ref: str) -> List[MurdockJob]:
-        return self.search_with_query(JobQueryModel(ref=ref))
+        return self._sort_jobs(self._jobs_by_ref.get(ref, ()))
 
     def search_matching(self, job: MurdockJob) -> List[MurdockJob]:
         result = []
@@ -178,28 +200,26 @@ class MurdockJobListBase(ABC):
                 for job in self.jobs
                 if job is not None and job.commit.author == query.author
             }
-        return sorted(
-            list(
-                jobs.intersection(uid_job)
-                .intersection(is_pr_jobs)
-                .intersection(is_branch_jobs)
-                .intersection(is_tag_jobs)
-                .intersection(prnum_jobs)
-                .intersection(prstates_jobs)
-                .intersection(branch_jobs)
-                .intersection(tag_jobs)
-                .intersection(ref_jobs)
-                .intersection(sha_jobs)
-                .intersection(author_jobs)
-            ),
-            reverse=True,
-            key=lambda job: job.creation_time,
+        return self._sort_jobs(
+            jobs.intersection(uid_job)
+            .intersection(is_pr_jobs)
+            .intersection(is_branch_jobs)
+            .intersection(is_tag_jobs)
+            .intersection(prnum_jobs)
+            .intersection(prstates_jobs)
+            .intersection(branch_jobs)
+            .intersection(tag_jobs)
+            .intersection(ref_jobs)
+            .intersection(sha_jobs)
+            .intersection(author_jobs)
         )
 
 
 class MurdockJobList(MurdockJobListBase):
     def __init__(self):
         self._jobs = []
+        self._jobs_by_prnum = {}
+        self._jobs_by_ref = {}
 
     @property
     def jobs(self) -> Sequence[Optional[MurdockJob]]:
@@ -207,28 +227,43 @@ class MurdockJobList(MurdockJobListBase):
 
     def add(self, *jobs: MurdockJob) -> None:
         self._jobs += jobs
+        for job in jobs:
+            self._index_job(job)
 
     def remove(self, job: MurdockJob) -> None:
         if job in self._jobs:
-            self._jobs.remove(job)
+            removed = self._jobs.pop(self._jobs.index(job))
+            if removed not in self._jobs:
+                self._unindex_job(removed)  # type: ignore[arg-type]
 
 
 class MurdockJobPool(MurdockJobListBase):
     def __init__(self, maxlen: int):
         self._jobs = maxlen * [None]  # type: ignore[assignment]
+        self._jobs_by_prnum = {}
+        self._jobs_by_ref = {}
+        self._free_slots = maxlen
 
     @property
     def jobs(self) -> Sequence[Optional[MurdockJob]]:
         return self._jobs
 
+    @property
+    def free_slots(self) -> int:
+        return self._free_slots
+
     def add(self, *jobs: MurdockJob) -> None:
         for job in jobs:
             for index, current in enumerate(self.jobs):
                 if current is None:
                     self._jobs[index] = job
+                    self._index_job(job)
+                    self._free_slots -= 1
                     break
 
     def remove(self, job: MurdockJob) -> None:
         for index, current in enumerate(self.jobs):
             if current == job:
                 self._jobs[index] = None
+                self._unindex_job(current)  # type: ignore[arg-type]
+                self._free_slots += 1
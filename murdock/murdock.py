@@ -1,19 +1,22 @@
 import asyncio
+import functools
+import itertools
 import json
 import os
 import re
 import time
 
-from typing import List, Optional, Union
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
 
-import websockets
+import orjson
 from fastapi import WebSocket
 
-from murdock.config import GLOBAL_CONFIG, CI_CONFIG
+from murdock.config import GLOBAL_CONFIG, CI_CONFIG, MurdockSettings
 from murdock.log import LOGGER
 from murdock.job import MurdockJob
 from murdock.job_containers import MurdockJobList, MurdockJobPool
 from murdock.models import (
+    CommitModel,
     JobModel,
     ManualJobBranchParamModel,
     ManualJobTagParamModel,
@@ -27,8 +30,9 @@ from murdock.github import (
     fetch_branch_info,
     fetch_tag_info,
     fetch_user_login,
-    set_commit_status,
     fetch_murdock_config,
+    CommitCache,
+    StatusWriter,
 )
 from murdock.database import Database
 from murdock.notify import Notifier
@@ -44,6 +48,19 @@ ALLOWED_ACTIONS = [
     "opened",
     "reopened",
 ]
+RELOAD_JOBS_MSG = orjson.dumps({"cmd": "reload"}).decode()
+RELOAD_JOBS_DELAY = 0.05
+MAX_PARALLEL_JOB_DATA_REMOVALS = 8
+
+
+@functools.lru_cache(maxsize=128)
+def _skip_keywords_re(keywords: Tuple[str, ...]) -> re.Pattern:
+    return re.compile("|".join(re.escape(keyword) for keyword in keywords))
+
+
+@functools.lru_cache(maxsize=128)
+def _ref_rule_re(rule: str) -> re.Pattern:
+    return re.compile(rule)
 
 
 class Murdock:
@@ -65,17 +82,39 @@ class Murdock:
         self.cancel_on_update: bool = cancel_on_update
         self.store_stopped_jobs: bool = store_stopped_jobs
         self.enable_notifications: bool = enable_notifications
-        self.clients: List[WebSocket] = []
+        self.clients: Set[WebSocket] = set()
         self.num_workers: int = num_workers
         self.queued: MurdockJobList = MurdockJobList()
         self.running: MurdockJobPool = MurdockJobPool(num_workers)
-        self.queue: asyncio.Queue = asyncio.Queue()
-        self.fasttrack_queue: asyncio.Queue = asyncio.Queue()
+        # Queue items are (priority, insertion order, job) tuples, fasttracked
+        # jobs have the lowest priority value so they are processed first
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self.queue_counter = itertools.count()
         self.db = Database()
         self.notifier = Notifier()
+        self.status_writer = StatusWriter()
+        self.commit_cache = CommitCache()
+        self.reload_jobs_event: Optional[asyncio.Event] = None
+        self.pr_event_handlers: Dict[
+            str, Callable[[dict, PullRequestInfo], Awaitable[Optional[str]]]
+        ] = {
+            "edited": self._handle_pr_ignored,
+            "labeled": self._handle_pr_labeled,
+            "unlabeled": self._handle_pr_ignored,
+            "synchronize": self._handle_pr_updated,
+            "created": self._handle_pr_updated,
+            "closed": self._handle_pr_closed,
+            # A PR opened with "Ready label" already set will be scheduled via
+            # the "labeled" action
+            "opened": self._handle_pr_ignored,
+            "reopened": self._handle_pr_updated,
+        }
 
     async def init(self):
         await self.db.init()
+        self.status_writer.start()
+        self.reload_jobs_event = asyncio.Event()
+        asyncio.create_task(self.reload_jobs_task(), name="MurdockReloadJobs")
         for index in range(self.num_workers):
             asyncio.create_task(
                 self.job_processing_task(), name=f"MurdockWorker_{index}"
@@ -84,9 +123,10 @@ class Murdock:
     async def shutdown(self):
         LOGGER.info("Shutting down Murdock")
         self.db.close()
-        for ws in self.clients:
-            LOGGER.debug(f"Closing websocket {ws}")
-            await ws.close()
+        LOGGER.debug(f"Closing {len(self.clients)} websockets")
+        await asyncio.gather(
+            *[ws.close() for ws in tuple(self.clients)], return_exceptions=True
+        )
         for job in self.queued.jobs:
             LOGGER.debug(f"Canceling {job}")
             job.cancelled = True
@@ -94,6 +134,7 @@ class Murdock:
             if job is not None:
                 LOGGER.debug(f"Stopping {job}")
                 await job.stop()
+        await self.status_writer.stop()
 
     async def _process_job(self, job: MurdockJob):
         if job.canceled is True:
@@ -112,18 +153,13 @@ class Murdock:
     async def job_processing_task(self):
         current_task = asyncio.current_task().get_name()
         while True:
-            if self.fasttrack_queue.qsize():
-                job = self.fasttrack_queue.get_nowait()
+            try:
+                _, _, job = await self.queue.get()
                 await self._process_job(job)
-                self.fasttrack_queue.task_done()
-            else:
-                try:
-                    job = await self.queue.get()
-                    await self._process_job(job)
-                    self.queue.task_done()
-                except RuntimeError as exc:
-                    LOGGER.info(f"Exiting worker {current_task}: {exc}")
-                    break
+                self.queue.task_done()
+            except RuntimeError as exc:
+                LOGGER.info(f"Exiting worker {current_task}: {exc}")
+                break
 
     async def job_prepare(self, job: MurdockJob):
         self.queued.remove(job)
@@ -131,7 +167,7 @@ class Murdock:
         job.state = "running"
         LOGGER.debug(f"{job} added to the running jobs")
         job.start_time = time.time()
-        await set_commit_status(
+        self.status_writer.submit(
             job.commit.sha,
             {
                 "state": "pending",
@@ -140,7 +176,7 @@ class Murdock:
                 "target_url": job.details_url,
             },
         )
-        await self.reload_jobs()
+        self.reload_jobs()
 
     async def job_finalize(self, job: MurdockJob):
         job.stop_time = time.time()
@@ -148,6 +184,7 @@ class Murdock:
             job.status["status"] = "finished"
         self.running.remove(job)
         LOGGER.debug(f"{job} removed from running jobs")
+        finalize_tasks = [self._store_finished_job(job)]
         if job.state == "stopped":
             status = {
                 "state": "pending",
@@ -172,8 +209,16 @@ class Murdock:
                 and job.config.pr.enable_comments
             ):
                 LOGGER.info(f"Posting comment on PR #{job.pr.number}")
-                await comment_on_pr(job)
-        await set_commit_status(job.commit.sha, status)
+                finalize_tasks.append(comment_on_pr(job))
+        self.status_writer.submit(job.commit.sha, status)
+        # Storing the job in DB and commenting on the PR are independent
+        results = await asyncio.gather(*finalize_tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                LOGGER.warning(f"Error while finalizing {job}: {result}")
+        self.reload_jobs()
+
+    async def _store_finished_job(self, job: MurdockJob):
         # Notifications must be called before inserting the job in DB
         # because the logic checks the result of the last matching job in DB.
         if job.state in ["passed", "errored"] and self.enable_notifications is True:
@@ -182,10 +227,9 @@ class Murdock:
             job.state == "stopped" and self.store_stopped_jobs
         ):
             await self.db.insert_job(job)
-        await self.reload_jobs()
 
     async def add_job_to_queue(self, job: MurdockJob):
-        await set_commit_status(
+        self.status_writer.submit(
             job.commit.sha,
             {
                 "state": "pending",
@@ -194,15 +238,13 @@ class Murdock:
                 "target_url": self.base_url,
             },
         )
-        all_busy = all(running is not None for running in self.running.jobs)
+        all_busy = self.running.free_slots == 0
         self.queued.add(job)
         job.state = "queued"
-        if all_busy and job.fasttracked:
-            self.fasttrack_queue.put_nowait(job)
-        else:
-            self.queue.put_nowait(job)
+        priority = 0 if all_busy and job.fasttracked else 1
+        self.queue.put_nowait((priority, next(self.queue_counter), job))
         LOGGER.info(f"{job} added to queued jobs")
-        await self.reload_jobs()
+        self.reload_jobs()
 
     async def cancel_queued_jobs_matching(self, job: MurdockJob) -> List[MurdockJob]:
         jobs_to_cancel = []
@@ -210,11 +252,10 @@ class Murdock:
             jobs_to_cancel += self.queued.search_by_pr_number(job.pr.number)
         if job.ref is not None:
             jobs_to_cancel += self.queued.search_by_ref(job.ref)
-        for job in jobs_to_cancel:
-            await self.cancel_queued_job(job)
+        await asyncio.gather(*[self.cancel_queued_job(job) for job in jobs_to_cancel])
         return jobs_to_cancel
 
-    async def cancel_queued_job(self, job: MurdockJob, reload_jobs=False):
+    async def cancel_queued_job(self, job: MurdockJob):
         LOGGER.debug(f"Canceling {job}")
         job.canceled = True
         self.queued.remove(job)
@@ -224,9 +265,8 @@ class Murdock:
             "target_url": self.base_url,
             "description": "Canceled",
         }
-        await set_commit_status(job.commit.sha, status)
-        if reload_jobs is True:
-            await self.reload_jobs()
+        self.status_writer.submit(job.commit.sha, status)
+        self.reload_jobs()
 
     async def stop_running_jobs_matching(self, job: MurdockJob) -> List[MurdockJob]:
         jobs_to_stop = []
@@ -234,8 +274,7 @@ class Murdock:
             jobs_to_stop += self.running.search_by_pr_number(job.pr.number)
         if job.ref is not None:
             jobs_to_stop += self.running.search_by_ref(job.ref)
-        for job in jobs_to_stop:
-            await self.stop_running_job(job)
+        await asyncio.gather(*[self.stop_running_job(job) for job in jobs_to_stop])
         return jobs_to_stop
 
     async def stop_running_job(self, job: MurdockJob, fail=False) -> MurdockJob:
@@ -249,11 +288,12 @@ class Murdock:
 
     async def disable_jobs_matching(self, job: MurdockJob) -> List[MurdockJob]:
         LOGGER.debug(f"Disable jobs matching {job}")
-        disabled_jobs = []
-        disabled_jobs += await self.cancel_queued_jobs_matching(job)
-        disabled_jobs += await self.stop_running_jobs_matching(job)
+        canceled_jobs, stopped_jobs = await asyncio.gather(
+            self.cancel_queued_jobs_matching(job), self.stop_running_jobs_matching(job)
+        )
+        disabled_jobs = canceled_jobs + stopped_jobs
         if disabled_jobs:
-            await self.reload_jobs()
+            self.reload_jobs()
         return disabled_jobs
 
     async def update_matching_prs(self, pull_request: PullRequestInfo):
@@ -303,14 +343,21 @@ class Murdock:
             pull_request.is_merged,
         )
         if modified_jobs:
-            await self.reload_jobs()
+            self.reload_jobs()
+
+    async def fetch_config(self, commit: str) -> MurdockSettings:
+        config = await self.commit_cache.fetch(fetch_murdock_config, commit)
+        if config is None:
+            LOGGER.warning(f"Using default config for commit {commit[0:7]}")
+            return MurdockSettings()
+        return config
 
     async def restart_job(self, uid: str, token: str) -> Optional[MurdockJob]:
         if (job := await self.db.find_job(uid)) is None:
             return job
         login = await fetch_user_login(token)
         LOGGER.info(f"Restarting {job}")
-        config = await fetch_murdock_config(job.commit.sha)
+        config = await self.fetch_config(job.commit.sha)
         new_job = MurdockJob(
             job.commit,
             pr=job.pr,
@@ -327,13 +374,14 @@ class Murdock:
         if (
             job.config is not None
             and job.config.commit is not None
-            and any(
-                skip_keyword in job.commit.message
-                for skip_keyword in job.config.commit.skip_keywords
+            and job.config.commit.skip_keywords
+            and _skip_keywords_re(tuple(job.config.commit.skip_keywords)).search(
+                job.commit.message
             )
+            is not None
         ):
             LOGGER.debug(f"Commit message contains skip keywords, skipping {job}")
-            await set_commit_status(
+            self.status_writer.submit(
                 job.commit.sha,
                 {
                     "state": "pending",
@@ -370,13 +418,7 @@ class Murdock:
             return "Invalid repo"
         LOGGER.info(f"Handle pull request event '{action}'")
         pr_data = event["pull_request"]
-        sender = event["sender"]["login"]
-        commit = await fetch_commit_info(pr_data["head"]["sha"])
-        if commit is None:
-            error_msg = "Cannot fetch commit information"
-            LOGGER.error(f"{error_msg}, aborting")
-            return error_msg
-        config = await fetch_murdock_config(commit.sha)
+        labels = {label["name"] for label in pr_data["labels"]}
         pull_request = PullRequestInfo(
             title=pr_data["title"],
             number=pr_data["number"],
@@ -388,30 +430,17 @@ class Murdock:
             base_commit=pr_data["base"]["sha"],
             base_full_name=pr_data["base"]["repo"]["full_name"],
             mergeable=pr_data["mergeable"] in [True, None],
-            labels=sorted([label["name"] for label in pr_data["labels"]]),
+            labels=sorted(labels),
             state=pr_data["state"],
             is_merged=pr_data["merged_at"] is not None,
         )
 
-        job = MurdockJob(
-            commit,
-            pr=pull_request,
-            config=config,
-            trigger=f"pr ({action})",
-            triggered_by=sender,
-        )
-
         # Update matching PRs (queued, running and finished)
         await self.update_matching_prs(pull_request)
 
-        action = event["action"]
-        if action == "closed":
-            LOGGER.info(f"PR #{pull_request.number} closed, disabling matching jobs")
-            await self.disable_jobs_matching(job)
-            return
-
-        if CI_CONFIG.ready_label not in pull_request.labels:
+        if action != "closed" and CI_CONFIG.ready_label not in labels:
             LOGGER.debug(f"'{CI_CONFIG.ready_label}' label not set")
+            job = self._pr_head_job(event, pull_request)
             await self.disable_jobs_matching(job)
             status = {
                 "state": "pending",
@@ -419,37 +448,71 @@ class Murdock:
                 "target_url": self.base_url,
                 "description": f'"{CI_CONFIG.ready_label}" label not set',
             }
-            await set_commit_status(job.commit.sha, status)
-            return
+            self.status_writer.submit(job.commit.sha, status)
+            return None
 
-        if action in ["unlabeled", "edited"]:
-            return
+        return await self.pr_event_handlers[action](event, pull_request)
 
-        if action == "opened" and CI_CONFIG.ready_label in pull_request.labels:
-            # A PR opened with "Ready label" already set will be scheduled via
-            # the "labeled" action
-            return
+    @staticmethod
+    def _pr_head_job(event: dict, pull_request: PullRequestInfo) -> MurdockJob:
+        # Only the head commit sha is needed to disable matching jobs, no need
+        # to fetch commit information and config from GitHub
+        return MurdockJob(
+            CommitModel(sha=event["pull_request"]["head"]["sha"]),
+            pr=pull_request,
+            trigger=f"pr ({event['action']})",
+            triggered_by=event["sender"]["login"],
+        )
 
-        if action == "labeled":
-            if event["label"]["name"] != CI_CONFIG.ready_label:
-                return
-            # Skip already queued jobs
-            if event["label"][
-                "name"
-            ] == CI_CONFIG.ready_label and self.queued.search_by_pr_number(
-                pull_request.number
-            ):
-                return
+    async def _handle_pr_ignored(
+        self, event: dict, pull_request: PullRequestInfo
+    ) -> Optional[str]:
+        return None
 
-        await self.schedule_job(job)
+    async def _handle_pr_closed(
+        self, event: dict, pull_request: PullRequestInfo
+    ) -> Optional[str]:
+        LOGGER.info(f"PR #{pull_request.number} closed, disabling matching jobs")
+        await self.disable_jobs_matching(self._pr_head_job(event, pull_request))
+        return None
+
+    async def _handle_pr_labeled(
+        self, event: dict, pull_request: PullRequestInfo
+    ) -> Optional[str]:
+        if event["label"]["name"] != CI_CONFIG.ready_label:
+            return None
+        # Skip already queued jobs
+        if self.queued.search_by_pr_number(pull_request.number):
+            return None
+        return await self._handle_pr_updated(event, pull_request)
+
+    async def _handle_pr_updated(
+        self, event: dict, pull_request: PullRequestInfo
+    ) -> Optional[str]:
+        commit = await self.commit_cache.fetch(
+            fetch_commit_info, event["pull_request"]["head"]["sha"]
+        )
+        if commit is None:
+            error_msg = "Cannot fetch commit information"
+            LOGGER.error(f"{error_msg}, aborting")
+            return error_msg
+        config = await self.fetch_config(commit.sha)
+        await self.schedule_job(
+            MurdockJob(
+                commit,
+                pr=pull_request,
+                config=config,
+                trigger=f"pr ({event['action']})",
+                triggered_by=event["sender"]["login"],
+            )
+        )
+        return None
 
     @staticmethod
     def handle_ref(ref: str, rules: List[str]) -> bool:
-        return bool(
-            "*" in rules
-            or ref in rules
-            or (rules and any(re.match(expr, ref) is not None for expr in rules))
-        )
+        if "*" in rules or ref in rules:
+            return True
+        return any(_ref_rule_re(rule).match(ref) is not None for rule in rules)
 
     async def handle_push_event(self, event: dict):
         if (
@@ -465,15 +528,15 @@ class Murdock:
                 f"Ref was removed upstream, aborting all jobs related to ref '{ref}'"
             )
             for job in self.running.search_by_ref(ref):
-                await self.cancel_queued_job(job, reload_jobs=True)
+                await self.cancel_queued_job(job)
             for job in self.queued.search_by_ref(ref):
                 await self.stop_running_job(job)
             return
-        commit = await fetch_commit_info(event["after"])
+        commit = await self.commit_cache.fetch(fetch_commit_info, event["after"])
         if commit is None:
             LOGGER.error("Cannot fetch commit information, aborting")
             return
-        config = await fetch_murdock_config(commit.sha)
+        config = await self.fetch_config(commit.sha)
         if (
             ref_type == "heads"
             and not Murdock.handle_ref(ref_name, config.push.branches)
@@ -491,27 +554,31 @@ class Murdock:
         )
 
     def add_ws_client(self, ws: WebSocket):
-        if ws not in self.clients:
-            self.clients.append(ws)
+        self.clients.add(ws)
 
     def remove_ws_client(self, ws: WebSocket):
-        if ws in self.clients:
-            self.clients.remove(ws)
-
-    async def _send_text_safe(self, client: WebSocket, msg: str):
-        try:
-            await client.send_text(msg)
-        except websockets.exceptions.ConnectionClosedError as exc:
-            LOGGER.warning(f"Could send msg to websocket client: {exc}")
-            await asyncio.sleep(0.1)
+        self.clients.discard(ws)
 
     async def notify_message_to_clients(self, msg: str):
-        await asyncio.gather(
-            *[self._send_text_safe(client, msg) for client in self.clients]
+        clients = tuple(self.clients)
+        results = await asyncio.gather(
+            *[client.send_text(msg) for client in clients], return_exceptions=True
         )
+        for client, result in zip(clients, results):
+            if isinstance(result, Exception):
+                LOGGER.warning(f"Could not send msg to websocket client: {result}")
+                self.remove_ws_client(client)
 
-    async def reload_jobs(self):
-        await self.notify_message_to_clients(json.dumps({"cmd": "reload"}))
+    def reload_jobs(self):
+        if self.reload_jobs_event is not None:
+            self.reload_jobs_event.set()
+
+    async def reload_jobs_task(self):
+        while True:
+            await self.reload_jobs_event.wait()  # type: ignore[union-attr]
+            await asyncio.sleep(RELOAD_JOBS_DELAY)
+            self.reload_jobs_event.clear()  # type: ignore[union-attr]
+            await self.notify_message_to_clients(RELOAD_JOBS_MSG)
 
     def get_queued_jobs(self, query: JobQueryModel = JobQueryModel()) -> List[JobModel]:
         return sorted(
@@ -537,24 +604,31 @@ class Murdock:
         MurdockJob.remove_dir(work_dir)
 
     async def remove_finished_jobs(self, query: JobQueryModel) -> List[JobModel]:
-        query.limit = await (self.db.count_jobs(query))
-        jobs_to_remove = await (self.db.find_jobs(query))
-        for job in jobs_to_remove:
-            self._remove_job_data(job.uid)
-        await self.db.delete_jobs(query)
+        query.limit = None
+        jobs_to_remove = await self.db.find_jobs(query)
+        semaphore = asyncio.Semaphore(MAX_PARALLEL_JOB_DATA_REMOVALS)
+
+        async def _remove_job_data_bounded(uid):
+            async with semaphore:
+                await asyncio.to_thread(self._remove_job_data, uid)
+
+        await asyncio.gather(
+            *[_remove_job_data_bounded(job.uid) for job in jobs_to_remove]
+        )
+        await self.db.delete_jobs_by_uids([job.uid for job in jobs_to_remove])
         LOGGER.info(f"{len(jobs_to_remove)} jobs removed")
-        await self.reload_jobs()
+        self.reload_jobs()
         return jobs_to_remove
 
     async def remove_job(self, uid: str) -> Optional[JobModel]:
         if (job := self.queued.search_by_uid(uid)) is not None:
-            await self.cancel_queued_job(job, reload_jobs=True)
+            await self.cancel_queued_job(job)
             return job.model()
         elif (job := self.running.search_by_uid(uid)) is not None:
             await self.stop_running_job(job)
             return job.model()
         elif (jobs := await self.db.find_jobs(JobQueryModel(uid=uid))) and jobs:
-            self._remove_job_data(uid)
+            await asyncio.to_thread(self._remove_job_data, uid)
             await self.db.delete_jobs(JobQueryModel(uid=uid))
             return jobs[0]
         return None
@@ -590,7 +664,7 @@ class Murdock:
         login = await fetch_user_login(token)
 
         # Fetch and setup job configuration
-        config = await fetch_murdock_config(commit.sha)
+        config = await self.fetch_config(commit.sha)
 
         LOGGER.info(f"Schedule manual job for ref '{ref}'")
         job = MurdockJob(
@@ -626,7 +700,7 @@ class Murdock:
         self, token, param: ManualJobCommitParamModel
     ) -> Optional[JobModel]:
         LOGGER.debug(f"Starting manual job on commit {param.sha}")
-        commit = await fetch_commit_info(param.sha)
+        commit = await self.commit_cache.fetch(fetch_commit_info, param.sha)
         ref = f"Commit {param.sha}"
         return await self.start_job(ref, commit, token, param)
 
@@ -648,5 +722,13 @@ class Murdock:
                 LOGGER.debug(f"Failfast enabled and failures detected, stopping {job}")
                 job = await self.stop_running_job(job, fail=True)
             data.update({"cmd": "status", "uid": job.uid})
-            await self.notify_message_to_clients(json.dumps(data))
+            try:
+                msg = orjson.dumps(data).decode()
+            except orjson.JSONEncodeError:
+                # orjson rejects some valid payloads, e.g. integers over 64 bits
+                msg = json.dumps(data)
+            # Jobs often send the same status repeatedly, only notify changes
+            if msg != job.last_status_msg:
+                job.last_status_msg = msg
+                await self.notify_message_to_clients(msg)
         return job
@@ -63,5 +63,8 @@ async def test_database(caplog):
     assert search_job.pr == job_branch.pr
     assert search_job.user_env == job_branch.user_env
 
+    await db.delete_jobs_by_uids(["123", job_branch.uid])
+    assert await db.find_job(job_branch.uid) is None
+
     db.close()
     assert "Closing database connection" in caplog.text
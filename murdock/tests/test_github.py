@@ -1,3 +1,4 @@
+import asyncio
 import json
 from unittest import mock
 
@@ -16,6 +17,8 @@ from murdock.github import (
     fetch_user_login,
     set_commit_status,
     fetch_murdock_config,
+    CommitCache,
+    StatusWriter,
     MAX_PAGES_COUNT,
 )
 
@@ -426,18 +429,111 @@ async def test_set_commit_status(post, caplog, code, text, status):
         assert f"<Response [403 Forbidden]>: {json.loads(text)}" in caplog.text
 
 
+@pytest.mark.asyncio
+@mock.patch("murdock.github.set_commit_status")
+async def test_status_writer(status):
+    writer = StatusWriter(delay=0.01)
+    writer.start()
+    writer.submit("12345678", {"description": "queued"})
+    writer.submit("12345678", {"description": "started"})
+    writer.submit("abcdef12", {"description": "queued"})
+    status.assert_not_called()
+    await asyncio.sleep(0.1)
+    assert status.call_count == 2
+    status.assert_any_call("12345678", {"description": "started"})
+    status.assert_any_call("abcdef12", {"description": "queued"})
+    writer.submit("12345678", {"description": "finished"})
+    await writer.stop()
+    assert status.call_count == 3
+    status.assert_called_with("12345678", {"description": "finished"})
+
+
+@pytest.mark.asyncio
+@mock.patch("murdock.github.set_commit_status")
+async def test_status_writer_stop_during_flush(status):
+    sent = []
+
+    async def _set_commit_status(commit, status):
+        await asyncio.sleep(0.05)
+        sent.append((commit, status))
+
+    status.side_effect = _set_commit_status
+    writer = StatusWriter(delay=0)
+    writer.start()
+    writer.submit("12345678", {"description": "finished"})
+    await asyncio.sleep(0.01)
+    status.assert_called_once()
+    await writer.stop()
+    assert sent == [("12345678", {"description": "finished"})]
+
+
+@pytest.mark.asyncio
+@mock.patch("murdock.github.set_commit_status")
+async def test_status_writer_error(status, caplog):
+    status.side_effect = Exception("error")
+    writer = StatusWriter()
+    writer.submit("12345678", {"description": "queued"})
+    await writer.flush()
+    status.assert_called_once()
+    assert "Cannot set commit 1234567 status: error" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_commit_cache():
+    async def _fetch(commit):
+        await asyncio.sleep(0.01)
+        return f"result {commit}"
+
+    fetch = mock.AsyncMock(side_effect=_fetch)
+    cache = CommitCache(ttl=0.1)
+    results = await asyncio.gather(
+        cache.fetch(fetch, "abcdef"),
+        cache.fetch(fetch, "abcdef"),
+        cache.fetch(fetch, "123456"),
+    )
+    assert results == ["result abcdef", "result abcdef", "result 123456"]
+    assert fetch.call_count == 2
+    assert await cache.fetch(fetch, "abcdef") == "result abcdef"
+    assert fetch.call_count == 2
+    await asyncio.sleep(0.1)
+    assert await cache.fetch(fetch, "abcdef") == "result abcdef"
+    assert fetch.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_commit_cache_failures():
+    fetch = mock.AsyncMock(return_value=None)
+    cache = CommitCache()
+    assert await cache.fetch(fetch, "abcdef") is None
+    assert await cache.fetch(fetch, "abcdef") is None
+    assert fetch.call_count == 2
+    fetch.side_effect = Exception("error")
+    with pytest.raises(Exception):
+        await cache.fetch(fetch, "abcdef")
+    fetch.side_effect = None
+    fetch.return_value = "result"
+    assert await cache.fetch(fetch, "abcdef") == "result"
+    assert fetch.call_count == 4
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     "text,code,result",
     [
         pytest.param(json.dumps({"details": "error"}), 404, {}, id="config_not_found"),
+        pytest.param(
+            json.dumps({"details": "error"}), 500, None, id="config_fetch_error"
+        ),
+        pytest.param(
+            json.dumps({"details": "error"}), 403, None, id="config_rate_limited"
+        ),
         pytest.param(
             json.dumps({"content": ""}), 200, {}, id="config_found_content_empty"
         ),
         pytest.param(
             json.dumps({"content": "YnJhbmNoZXM6IF1b"}),
             200,
-            {},
+            None,
             id="config_found_invalid_content",
         ),
         pytest.param(
@@ -447,7 +543,7 @@ async def test_set_commit_status(post, caplog, code, text, status):
                 }
             ),
             200,
-            {},
+            None,
             id="config_found_invalid_fields",
         ),
         pytest.param(
@@ -512,4 +608,7 @@ async def test_fetch_murdock_config(get, text, code, result):
             "Authorization": f"token {GITHUB_CONFIG.api_token}",
         },
     )
-    assert fetch_result == MurdockSettings(**result)
+    if result is None:
+        assert fetch_result is None
+    else:
+        assert fetch_result == MurdockSettings(**result)
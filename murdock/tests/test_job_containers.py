@@ -244,22 +244,28 @@ def test_pool_add_remove():
     job_pool = MurdockJobPool(3)
     job_pool.add(*[])
     assert len(job_pool.jobs) == 3
+    assert job_pool.free_slots == 3
     assert all(job is None for job in job_pool.jobs)
     job_pool.add(job1)
     assert job1 in job_pool.jobs
     assert len(job_pool.jobs) == 3
+    assert job_pool.free_slots == 2
     job_pool.add(*[job2, job3])
     assert len(job_pool.jobs) == 3
+    assert job_pool.free_slots == 0
     assert job2 in job_pool.jobs
     assert job3 in job_pool.jobs
     job_pool.add(job4)
     assert job4 not in job_pool.jobs
     assert len(job_pool.jobs) == 3
+    assert job_pool.free_slots == 0
     job_pool.remove(job2)
     assert len(job_pool.jobs) == 3
+    assert job_pool.free_slots == 1
     assert job2 not in job_pool.jobs
     job_pool.remove(job2)
     assert len(job_pool.jobs) == 3
+    assert job_pool.free_slots == 1
     assert job2 not in job_pool.jobs
 
 
@@ -278,3 +284,27 @@ def test_pool_search_by_uid():
     assert job_pool.search_by_uid(job2.uid) is job2
     assert job_pool.search_by_uid(job3.uid) is job3
     assert job_pool.search_by_uid("invalid") is None
+
+
+def test_list_search_by_pr_number_and_ref_after_remove():
+    job_list = MurdockJobList()
+    job_list.add(*[test_job1, test_job2, test_job4, test_job5])
+    job_list.remove(test_job1)
+    job_list.remove(test_job4)
+    assert job_list.search_by_pr_number(123) == [test_job2]
+    assert job_list.search_by_ref("test_ref") == [test_job5]
+    job_list.remove(test_job2)
+    job_list.remove(test_job5)
+    assert job_list.search_by_pr_number(123) == []
+    assert job_list.search_by_ref("test_ref") == []
+
+
+def test_pool_search_by_pr_number_and_ref():
+    job_pool = MurdockJobPool(3)
+    job_pool.add(*[test_job1, test_job2, test_job4, test_job5])
+    assert job_pool.search_by_pr_number(123) == [test_job2, test_job1]
+    assert job_pool.search_by_ref("test_ref") == [test_job4]
+    job_pool.remove(test_job1)
+    assert job_pool.search_by_pr_number(123) == [test_job2]
+    job_pool.remove(test_job4)
+    assert job_pool.search_by_ref("test_ref") == []
@@ -2,6 +2,8 @@ import asyncio
 import json
 import logging
 import os
+import threading
+import time
 
 from datetime import datetime
 
@@ -10,7 +12,7 @@ from unittest import mock
 
 import pytest
 
-from murdock.murdock import Murdock
+from murdock.murdock import ALLOWED_ACTIONS, Murdock
 from murdock.models import (
     CommitModel,
     JobQueryModel,
@@ -84,7 +86,7 @@ exit {run_ret}
     ],
 )
 @mock.patch("murdock.murdock.comment_on_pr")
-@mock.patch("murdock.murdock.set_commit_status")
+@mock.patch("murdock.github.set_commit_status")
 @mock.patch("murdock.database.Database.insert_job")
 @mock.patch("murdock.notify.Notifier.notify")
 async def test_schedule_single_job(
@@ -145,7 +147,9 @@ async def test_schedule_single_job(
         comment.assert_not_called()
     assert job.status == {"status": "finished"}
     assert job.state == job_state
-    assert status.call_count == 3
+    await murdock.status_writer.flush()
+    # "queued" and "started" statuses are coalesced into a single update
+    assert status.call_count == 2
 
 
 @pytest.mark.asyncio
@@ -157,7 +161,7 @@ async def test_schedule_single_job(
         pytest.param([1, 2, 1, 2], 2, 2, id="queued_some_matching"),
     ],
 )
-@mock.patch("murdock.murdock.set_commit_status")
+@mock.patch("murdock.github.set_commit_status")
 async def test_schedule_multiple_jobs(
     __, prnums, num_queued, free_slots, tmpdir, caplog
 ):
@@ -214,7 +218,7 @@ async def test_schedule_multiple_jobs(
 
 @pytest.mark.asyncio
 @pytest.mark.usefixtures("mongo")
-@mock.patch("murdock.murdock.set_commit_status", mock.AsyncMock())
+@mock.patch("murdock.github.set_commit_status", mock.AsyncMock())
 async def test_schedule_multiple_jobs_with_fasttracked(tmpdir, caplog):
     caplog.set_level(logging.DEBUG, logger="murdock")
     scripts_dir = tmpdir.join("scripts").realpath()
@@ -311,6 +315,20 @@ async def test_restart_job(find, fetch_config, schedule, job_found, caplog):
         assert f"Restarting {job_found}" in caplog.text
 
 
+@pytest.mark.asyncio
+@mock.patch("murdock.murdock.fetch_murdock_config")
+async def test_fetch_config(fetch_config, caplog):
+    murdock = Murdock()
+    fetch_config.return_value = None
+    assert await murdock.fetch_config("abcdef12") == MurdockSettings()
+    assert "Using default config for commit abcdef1" in caplog.text
+    config = MurdockSettings(env={"TEST_ENV": "42"})
+    fetch_config.return_value = config
+    assert await murdock.fetch_config("abcdef12") == config
+    assert await murdock.fetch_config("abcdef12") == config
+    assert fetch_config.call_count == 2
+
+
 pr_event = {
     "pull_request": {
         "title": "test",
@@ -365,16 +383,16 @@ async def test_handle_pr_event_action_missing(
 
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
-    "action,allowed,queued_called",
+    "action,allowed,fetched,queued_called",
     [
-        ("invalid", False, False),
-        ("synchronize", True, True),
-        ("labeled", True, False),
-        ("unlabeled", True, False),
-        ("opened", True, False),
-        ("reopened", True, True),
-        ("closed", True, False),
-        ("created", True, True),
+        ("invalid", False, False, False),
+        ("synchronize", True, True, True),
+        ("labeled", True, False, False),
+        ("unlabeled", True, False, False),
+        ("opened", True, False, False),
+        ("reopened", True, True, True),
+        ("closed", True, False, False),
+        ("created", True, True, True),
     ],
 )
 @mock.patch("murdock.murdock.fetch_murdock_config")
@@ -390,6 +408,7 @@ async def test_handle_pr_event_action(
     fetch_config,
     action,
     allowed,
+    fetched,
     queued_called,
     caplog,
 ):
@@ -405,13 +424,16 @@ async def test_handle_pr_event_action(
     murdock = Murdock()
     await murdock.handle_pull_request_event(event)
     if allowed:
+        assert f"Handle pull request event '{action}'" in caplog.text
+    else:
+        assert f"Handle pull request event '{action}'" not in caplog.text
+
+    if fetched:
         fetch_config.assert_called_with(commit)
         fetch_commit.assert_called_with(commit)
-        assert f"Handle pull request event '{action}'" in caplog.text
     else:
         fetch_config.assert_not_called()
         fetch_commit.assert_not_called()
-        assert f"Handle pull request event '{action}'" not in caplog.text
 
     if queued_called:
         queued.assert_called_once()
@@ -425,18 +447,25 @@ async def test_handle_pr_event_action(
         assert "PR #123 closed, disabling matching jobs" not in caplog.text
 
 
+@pytest.mark.asyncio
+async def test_pr_event_handlers():
+    assert sorted(Murdock().pr_event_handlers) == sorted(ALLOWED_ACTIONS)
+
+
 @pytest.mark.asyncio
 @mock.patch("murdock.murdock.fetch_murdock_config")
 @mock.patch("murdock.murdock.fetch_commit_info")
 @mock.patch("murdock.murdock.Murdock.add_job_to_queue")
+@mock.patch("murdock.database.Database.update_jobs")
 async def test_handle_pr_event_missing_commit_info(
-    queued, fetch_commit, fetch_config, caplog
+    update, queued, fetch_commit, fetch_config, caplog
 ):
     caplog.set_level(logging.DEBUG, logger="murdock")
     event = pr_event.copy()
     event.update({"action": "synchronize"})
     fetch_config.return_value = MurdockSettings()
     fetch_commit.return_value = None
+    update.return_value = 0
     murdock = Murdock()
     await murdock.handle_pull_request_event(event)
     queued.assert_not_called()
@@ -458,11 +487,14 @@ async def test_handle_pr_event_missing_commit_info(
         pytest.param(
             "message summary\n\ndetail", ["ci: skip"], False, id="no_skip_multi_lines"
         ),
+        pytest.param("[ci skip]", ["[ci skip]"], True, id="skip_special_chars"),
+        pytest.param("ci skip", ["[ci skip]"], False, id="no_skip_special_chars"),
+        pytest.param("ci: skip", [], False, id="no_skip_no_keywords"),
     ],
 )
 @mock.patch("murdock.murdock.fetch_murdock_config")
 @mock.patch("murdock.murdock.fetch_commit_info")
-@mock.patch("murdock.murdock.set_commit_status")
+@mock.patch("murdock.github.set_commit_status")
 @mock.patch("murdock.murdock.Murdock.add_job_to_queue")
 @mock.patch("murdock.database.Database.update_jobs")
 async def test_handle_pr_event_skip_commit(
@@ -487,6 +519,7 @@ async def test_handle_pr_event_skip_commit(
     update.return_value = 0
     murdock = Murdock()
     await murdock.handle_pull_request_event(event)
+    await murdock.status_writer.flush()
     assert "Handle pull request event" in caplog.text
     fetch_config.assert_called_with(commit)
     fetch_commit.assert_called_with(commit)
@@ -522,8 +555,8 @@ async def test_handle_pr_event_missing_ready_label(
     murdock = Murdock()
     await murdock.handle_pull_request_event(event)
     queued.assert_not_called()
-    fetch_config.assert_called_once()
-    fetch_commit.assert_called_once()
+    fetch_config.assert_not_called()
+    fetch_commit.assert_not_called()
     assert "Handle pull request event" in caplog.text
     assert f"'{CI_CONFIG.ready_label}' label not set" in caplog.text
     assert "Scheduling new job" not in caplog.text
@@ -579,7 +612,7 @@ async def test_handle_pr_event_missing_ready_label(
     ],
 )
 @mock.patch("murdock.job_containers.MurdockJobListBase.search_by_pr_number")
-@mock.patch("murdock.murdock.set_commit_status")
+@mock.patch("murdock.github.set_commit_status")
 @mock.patch("murdock.murdock.fetch_murdock_config")
 @mock.patch("murdock.murdock.fetch_commit_info")
 @mock.patch("murdock.murdock.Murdock.add_job_to_queue")
@@ -613,12 +646,14 @@ async def test_handle_pr_event_labeled_action(
     murdock = Murdock()
     await murdock.handle_pull_request_event(event)
     assert "Handle pull request event" in caplog.text
-    fetch_config.assert_called_once()
-    fetch_commit.assert_called_once()
     if scheduled:
+        fetch_config.assert_called_once()
+        fetch_commit.assert_called_once()
         queued.assert_called_once()
         assert "Scheduling new job" in caplog.text
     else:
+        fetch_config.assert_not_called()
+        fetch_commit.assert_not_called()
         queued.assert_not_called()
         assert "Scheduling new job" not in caplog.text
 
@@ -720,6 +755,27 @@ async def test_handle_push_event_ref_not_handled(
     assert "Scheduling new job" not in caplog.text
 
 
+@pytest.mark.parametrize(
+    "ref,rules,expected",
+    [
+        pytest.param("main", [], False, id="empty_rules"),
+        pytest.param("main", ["*"], True, id="wildcard"),
+        pytest.param("main", ["main"], True, id="exact"),
+        pytest.param("main", ["other", "release"], False, id="no_match"),
+        pytest.param("v1.2.3", ["other", r"v(\d+\.)?(\d+\.)?(\d+)"], True, id="regex"),
+        pytest.param("2022.07-branch", [r"\d{4}\.\d{2}-branch"], True, id="regex_2"),
+        pytest.param("main-test", ["main"], True, id="prefix"),
+        pytest.param("test-main", ["main"], False, id="not_prefix"),
+        pytest.param("MAIN", ["dev", "(?i)main"], True, id="inline_flag"),
+        pytest.param("DEV", ["dev", "(?i)main"], False, id="inline_flag_scoped"),
+        pytest.param("aa", ["(x)", r"(a)\1"], True, id="backreference"),
+        pytest.param("main", ["main.*", "("], True, id="invalid_later_rule"),
+    ],
+)
+def test_handle_ref(ref, rules, expected):
+    assert Murdock.handle_ref(ref, rules) is expected
+
+
 @pytest.mark.asyncio
 @mock.patch("murdock.murdock.fetch_murdock_config")
 @mock.patch("murdock.murdock.fetch_commit_info")
@@ -762,7 +818,7 @@ async def test_handle_push_event_commit_fetch_error(
 )
 @mock.patch("murdock.murdock.fetch_murdock_config")
 @mock.patch("murdock.murdock.fetch_commit_info")
-@mock.patch("murdock.murdock.set_commit_status")
+@mock.patch("murdock.github.set_commit_status")
 @mock.patch("murdock.murdock.Murdock.add_job_to_queue")
 async def test_handle_push_event_skip_commit(
     queued,
@@ -790,6 +846,7 @@ async def test_handle_push_event_skip_commit(
         "sender": {"login": "user"},
     }
     await murdock.handle_push_event(event)
+    await murdock.status_writer.flush()
     fetch_config.assert_called_with(commit)
     fetch_commit.assert_called_with(commit)
     assert f"Ref '{branch}' not accepted for push events" not in caplog.text
@@ -832,7 +889,7 @@ async def test_handle_push_event_ref_removed(
         "sender": {"login": "user"},
     }
     await murdock.handle_push_event(event)
-    cancel.assert_called_with(job, reload_jobs=True)
+    cancel.assert_called_with(job)
     stop.assert_called_with(job)
     fetch_config.assert_not_called()
     fetch_commit.assert_not_called()
@@ -892,6 +949,19 @@ async def test_handle_push_event_unsupported_repo(caplog):
             True,
             id="job_found_valid_status",
         ),
+        pytest.param(
+            MurdockJob(
+                CommitModel(
+                    sha="test_commit",
+                    tree="test_tree",
+                    message="test message",
+                    author="test_user",
+                )
+            ),
+            {"status": {"total": 2**70}},
+            True,
+            id="job_found_large_int_status",
+        ),
     ],
 )
 @mock.patch("murdock.job_containers.MurdockJobListBase.search_by_uid")
@@ -902,11 +972,100 @@ async def test_handle_job_status_data(notify, search, job_found, data, called):
     await murdock.handle_job_status_data("1234", data)
     if called is True:
         data.update({"cmd": "status", "uid": job_found.uid})
-        notify.assert_called_with(json.dumps(data))
+        notify.assert_called_once()
+        assert json.loads(notify.call_args[0][0]) == data
     else:
         notify.assert_not_called()
 
 
+@pytest.mark.asyncio
+@mock.patch("murdock.job_containers.MurdockJobListBase.search_by_uid")
+@mock.patch("murdock.murdock.Murdock.notify_message_to_clients")
+async def test_handle_job_status_data_unchanged(notify, search):
+    job = MurdockJob(
+        CommitModel(
+            sha="test_commit",
+            tree="test_tree",
+            message="test message",
+            author="test_user",
+        )
+    )
+    search.return_value = job
+    murdock = Murdock()
+    await murdock.handle_job_status_data(job.uid, {"status": {"status": "test"}})
+    await murdock.handle_job_status_data(job.uid, {"status": {"status": "test"}})
+    notify.assert_called_once()
+    await murdock.handle_job_status_data(job.uid, {"status": {"status": "other"}})
+    assert notify.call_count == 2
+    assert json.loads(notify.call_args[0][0]) == {
+        "cmd": "status",
+        "uid": job.uid,
+        "status": {"status": "other"},
+    }
+
+
+@pytest.mark.asyncio
+@mock.patch("murdock.job.MurdockJob.stop")
+async def test_disable_jobs_matching(stop):
+    def _job(prnum):
+        return MurdockJob(
+            CommitModel(
+                sha=f"test_commit{prnum}",
+                tree="test_tree",
+                message="test message",
+                author="test_user",
+            ),
+            pr=PullRequestInfo(number=prnum, labels=[]),
+        )
+
+    murdock = Murdock(num_workers=2)
+    queued = [_job(123), _job(123), _job(456)]
+    running = [_job(123), _job(456)]
+    murdock.queued.add(*queued)
+    murdock.running.add(*running)
+    disabled = await murdock.disable_jobs_matching(_job(123))
+    assert sorted(disabled, key=lambda job: job.uid) == sorted(
+        queued[:2] + running[:1], key=lambda job: job.uid
+    )
+    assert murdock.queued.jobs == [queued[2]]
+    assert all(job.canceled for job in queued[:2])
+    assert stop.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_notify_message_to_clients(caplog):
+    murdock = Murdock()
+    client_ok = mock.AsyncMock()
+    client_closed = mock.AsyncMock()
+    client_closed.send_text.side_effect = Exception("closed")
+    murdock.add_ws_client(client_ok)
+    murdock.add_ws_client(client_closed)
+    await murdock.notify_message_to_clients("test")
+    client_ok.send_text.assert_called_once_with("test")
+    client_closed.send_text.assert_called_once_with("test")
+    assert "Could not send msg to websocket client: closed" in caplog.text
+    assert client_ok in murdock.clients
+    assert client_closed not in murdock.clients
+
+
+@pytest.mark.asyncio
+@mock.patch("murdock.database.Database.init")
+@mock.patch("murdock.murdock.Murdock.job_processing_task")
+@mock.patch("murdock.murdock.Murdock.notify_message_to_clients")
+async def test_reload_jobs(notify, _, __):
+    murdock = Murdock()
+    await murdock.init()
+    for _ in range(5):
+        murdock.reload_jobs()
+    notify.assert_not_called()
+    await asyncio.sleep(0.1)
+    notify.assert_called_once()
+    assert json.loads(notify.call_args[0][0]) == {"cmd": "reload"}
+    murdock.reload_jobs()
+    await asyncio.sleep(0.1)
+    assert notify.call_count == 2
+
+
 @pytest.mark.asyncio
 @mock.patch("murdock.database.Database.find_jobs")
 @mock.patch("murdock.database.Database.delete_jobs")
@@ -944,7 +1103,7 @@ async def test_remove_job(queued, running, remove_dir, delete_jobs, find_jobs):
     find_jobs.return_value = [job_finished.model()]
 
     job = await murdock.remove_job(job_queued.uid)
-    queued.assert_called_with(job_queued, reload_jobs=True)
+    queued.assert_called_with(job_queued)
     assert job_queued == job
     job = await murdock.remove_job(job_running.uid)
     running.assert_called_with(job_running)
@@ -990,6 +1149,70 @@ async def test_remove_jobs():
     assert found_jobs == deleted_jobs
 
 
+@pytest.mark.asyncio
+@mock.patch("murdock.database.Database.find_jobs")
+@mock.patch("murdock.database.Database.delete_jobs_by_uids")
+@mock.patch("murdock.job.MurdockJob.remove_dir")
+async def test_remove_finished_jobs(remove_dir, delete_jobs, find_jobs):
+    murdock = Murdock()
+    jobs = [
+        MurdockJob(
+            CommitModel(
+                sha=f"test_commit{index}",
+                tree="test_tree",
+                message=f"test message {index}",
+                author="test_user",
+            )
+        ).model()
+        for index in range(3)
+    ]
+    find_jobs.return_value = jobs
+    query = JobQueryModel(before="2022-06-01")
+    assert await murdock.remove_finished_jobs(query) == jobs
+    assert query.limit is None
+    find_jobs.assert_called_once_with(query)
+    assert remove_dir.call_count == 3
+    for job in jobs:
+        remove_dir.assert_any_call(os.path.join(murdock.work_dir, job.uid))
+    delete_jobs.assert_called_once_with([job.uid for job in jobs])
+
+
+@pytest.mark.asyncio
+@mock.patch("murdock.murdock.MAX_PARALLEL_JOB_DATA_REMOVALS", 2)
+@mock.patch("murdock.database.Database.find_jobs")
+@mock.patch("murdock.database.Database.delete_jobs_by_uids")
+@mock.patch("murdock.job.MurdockJob.remove_dir")
+async def test_remove_finished_jobs_parallel(remove_dir, _, find_jobs):
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def _remove_dir(work_dir):
+        with lock:
+            running.append(work_dir)
+            max_running.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(work_dir)
+
+    remove_dir.side_effect = _remove_dir
+    find_jobs.return_value = [
+        MurdockJob(
+            CommitModel(
+                sha=f"test_commit{index}",
+                tree="test_tree",
+                message=f"test message {index}",
+                author="test_user",
+            )
+        ).model()
+        for index in range(6)
+    ]
+    murdock = Murdock()
+    await murdock.remove_finished_jobs(JobQueryModel(before="2022-06-01"))
+    assert remove_dir.call_count == 6
+    assert max(max_running) == 2
+
+
 @pytest.mark.asyncio
 @mock.patch("murdock.database.Database.find_jobs")
 async def test_get_job(find_jobs):